@@ -1,38 +1,100 @@
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from databases import Database
+from contextlib import asynccontextmanager
 from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from dotenv import load_dotenv
-import smtplib
+from typing import Optional
 import os
 
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Request
+from pydantic import BaseModel
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker, configure_mappers
+
 from models import Event, User, EventRegistration
 from schema import EventCreate, UserCreate, EventUpdate, EventRegistrationCreate, UserUpdate, SendEmail
 
-load_dotenv(".env")
 
-# FastAPI app
-app = FastAPI()
+# Application settings
+class Settings(BaseModel):
+    database_url: Optional[str] = None
+    email_host: Optional[str] = None
+    email_port: Optional[int] = None
+    # Number of pool connections to open before the app accepts traffic
+    warmup_connections: int = 1
+
+    # Read settings from the environment / .env file; keyword arguments override them
+    @classmethod
+    def from_env(cls, env_file=".env", **overrides):
+        from dotenv import load_dotenv
+
+        load_dotenv(env_file)
+        values = {
+            "database_url": os.getenv("DATABASE_URL"),
+            "email_host": os.getenv("EMAIL_HOST"),
+            "email_port": os.getenv("EMAIL_PORT"),
+            "warmup_connections": os.getenv("WARMUP_CONNECTIONS", 1),
+        }
+        values.update(overrides)
+        return cls(**values)
+
+
+# Open pool connections and prime caches before serving requests
+def warm_up(app: FastAPI):
+    settings = app.state.settings
+    engine = app.state.engine
+
+    # Build the ORM mappers now instead of on the first query
+    configure_mappers()
+
+    # Only connections within pool_size stay open; overflow ones are closed on return
+    warmup_connections = settings.warmup_connections
+    if hasattr(engine.pool, "size"):
+        warmup_connections = min(warmup_connections, engine.pool.size())
+
+    connections = []
+    try:
+        for _ in range(warmup_connections):
+            connection = engine.connect()
+            connection.execute(text("SELECT 1"))
+            connections.append(connection)
+    finally:
+        # Closing returns the connections to the pool, where they stay open
+        for connection in connections:
+            connection.close()
+
+    # Generate the OpenAPI schema once so /docs does not pay for it later
+    app.openapi()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Database setup
+    settings = app.state.settings or Settings.from_env()
+    app.state.settings = settings
+    app.state.engine = create_engine(settings.database_url)
+    app.state.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=app.state.engine)
+
+    warm_up(app)
+    try:
+        yield
+    finally:
+        app.state.engine.dispose()
 
-# Database setup
-engine = create_engine(os.getenv("DATABASE_URL"))
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-database = Database(os.getenv("DATABASE_URL"))
 
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    db = request.app.state.SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
 
+router = APIRouter()
+
+
 # Route to create a new event
-@app.post("/events/")
-async def create_event(event: EventCreate, db: SessionLocal = Depends(get_db)):
+@router.post("/events/")
+async def create_event(event: EventCreate, db: Session = Depends(get_db)):
     event_db = Event(**event.dict())
     db.add(event_db)
     db.commit()
@@ -40,8 +102,8 @@ async def create_event(event: EventCreate, db: SessionLocal = Depends(get_db)):
     return event
 
 # Route to update an event by ID
-@app.put("/events/{event_id}/")
-async def update_event(event_id: int, event_data: EventUpdate, db: SessionLocal = Depends(get_db)):
+@router.put("/events/{event_id}/")
+async def update_event(event_id: int, event_data: EventUpdate, db: Session = Depends(get_db)):
     # Check if the event with the specified ID exists
     event = db.query(Event).filter(Event.event_id == event_id).first()
 
@@ -60,8 +122,8 @@ async def update_event(event_id: int, event_data: EventUpdate, db: SessionLocal
     return event
 
 # Route to delete an event by ID
-@app.delete("/events/{event_id}/")
-async def delete_event(event_id: int, db: SessionLocal = Depends(get_db)):
+@router.delete("/events/{event_id}/")
+async def delete_event(event_id: int, db: Session = Depends(get_db)):
     # Check if the event with the specified ID exists
     event = db.query(Event).filter(Event.event_id == event_id).first()
 
@@ -76,8 +138,8 @@ async def delete_event(event_id: int, db: SessionLocal = Depends(get_db)):
 
 
 # Register a new user
-@app.post("/users/")
-async def create_user(user: UserCreate, db: SessionLocal = Depends(get_db)):
+@router.post("/users/")
+async def create_user(user: UserCreate, db: Session = Depends(get_db)):
     user_db = User(**user.dict())
     db.add(user_db)
     db.commit()
@@ -85,8 +147,8 @@ async def create_user(user: UserCreate, db: SessionLocal = Depends(get_db)):
     return user_db
 
 # Route to update a user by ID
-@app.put("/users/{user_id}/")
-async def update_user(user_id: int, user_data: UserUpdate, db: SessionLocal = Depends(get_db)):
+@router.put("/users/{user_id}/")
+async def update_user(user_id: int, user_data: UserUpdate, db: Session = Depends(get_db)):
     # Check if the user with the specified ID exists
     user = db.query(User).filter(User.user_id == user_id).first()
 
@@ -105,8 +167,8 @@ async def update_user(user_id: int, user_data: UserUpdate, db: SessionLocal = De
     return user
 
 # Route to delete a user by ID
-@app.delete("/users/{user_id}/")
-async def delete_user(user_id: int, db: SessionLocal = Depends(get_db)):
+@router.delete("/users/{user_id}/")
+async def delete_user(user_id: int, db: Session = Depends(get_db)):
     # Check if the user with the specified ID exists
     user = db.query(User).filter(User.user_id == user_id).first()
 
@@ -120,8 +182,8 @@ async def delete_user(user_id: int, db: SessionLocal = Depends(get_db)):
     return {"message": "User deleted successfully"}
 
 # Register a user for an event
-@app.post("/events/register/")
-async def register_user_for_event(event_registration: EventRegistrationCreate, db: SessionLocal = Depends(get_db)):
+@router.post("/events/register/")
+async def register_user_for_event(event_registration: EventRegistrationCreate, db: Session = Depends(get_db)):
     # Check if the user and event exist
     user = db.query(User).filter(User.user_id == event_registration.user_id).first()
     event = db.query(Event).filter(Event.event_id == event_registration.event_id).first()
@@ -146,8 +208,8 @@ async def register_user_for_event(event_registration: EventRegistrationCreate, d
     return registration_db
 
 # Route to get all users registered for a specific event
-@app.get("/events/{event_id}/registered_users/")
-async def get_registered_users(event_id: int, db: SessionLocal = Depends(get_db)):
+@router.get("/events/{event_id}/registered_users/")
+async def get_registered_users(event_id: int, db: Session = Depends(get_db)):
     event = db.query(Event).filter(Event.event_id == event_id).first()
 
     if not event:
@@ -161,8 +223,8 @@ async def get_registered_users(event_id: int, db: SessionLocal = Depends(get_db)
     return registered_users
 
 # Route to get all events registered by a specific user
-@app.get("/users/{user_id}/registered_events/")
-async def get_registered_events(user_id: int, db: SessionLocal = Depends(get_db)):
+@router.get("/users/{user_id}/registered_events/")
+async def get_registered_events(user_id: int, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.user_id == user_id).first()
 
     if not user:
@@ -176,9 +238,15 @@ async def get_registered_events(user_id: int, db: SessionLocal = Depends(get_db)
     return registered_events
 
 #SEND EMAIL INVITATION
-def send_invitation_email(to_email, event_name):
+def send_invitation_email(to_email, event_name, settings: Settings):
+    # smtplib is only needed here, so keep it out of the import path
+    import smtplib
+
+    if not settings.email_host:
+        raise HTTPException(status_code=500, detail="Email server is not configured")
+
     # Create an SMTP server connection
-    server = smtplib.SMTP(os.getenv("EMAIL_HOST"), os.getenv("EMAIL_PORT"))
+    server = smtplib.SMTP(settings.email_host, settings.email_port)
 
     # Create a MIMEText object for the email body
     message = MIMEMultipart()
@@ -197,12 +265,22 @@ def send_invitation_email(to_email, event_name):
     server.quit()
 
 # Route to send invitations to a list of users
-@app.post("/send_invitations/")
-async def send_invitations(send_email: SendEmail):
+@router.post("/send_invitations/")
+async def send_invitations(send_email: SendEmail, request: Request):
     print(send_email)
     emails = send_email.emails
     event_name = send_email.event_name
     for email in emails:
-        send_invitation_email(email, event_name)
+        send_invitation_email(email, event_name, request.app.state.settings)
     return {"message": f"Email sent succesffuly for {emails}"}
 
+
+# FastAPI app factory; settings default to Settings.from_env()
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+    app.include_router(router)
+    return app
+
+
+app = create_app()
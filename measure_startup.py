@@ -0,0 +1,24 @@
+# Measure import-to-first-request time of the app
+#
+# Usage: DATABASE_URL=sqlite:////tmp/events.db python measure_startup.py
+# The database needs the events table; the first request is DELETE /events/1/.
+import time
+
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    response = client.delete("/events/1/")
+    first_request = time.perf_counter()
+
+print(
+    f"import={1000 * (imported - start):.1f}ms "
+    f"startup={1000 * (started - imported):.1f}ms "
+    f"first_request={1000 * (first_request - started):.1f}ms "
+    f"total={1000 * (first_request - start):.1f}ms "
+    f"status={response.status_code}"
+)